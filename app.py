@@ -1,8 +1,25 @@
+import gzip
+import hmac
+import io
+import math
+import threading
 import time
 import requests
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import streamlit as st
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # stdlib fallback; same list/dict output, just slower
+    import json
+    _loads = json.loads
 
 # --------------------------------
 # Basic app setup
@@ -30,7 +47,7 @@ def check_password() -> bool:
     st.markdown("### 🔐 Enter password")
     pw = st.text_input("Password", type="password")
     if pw:
-        if pw == APP_PASSWORD:
+        if hmac.compare_digest(pw.encode(), APP_PASSWORD.encode()):
             st.session_state.auth_ok = True
             return True
         else:
@@ -43,35 +60,145 @@ def check_password() -> bool:
 SCREENER_URL   = "https://financialmodelingprep.com/stable/company-screener"
 RATIOS_TTM_V3  = "https://financialmodelingprep.com/api/v3/ratios-ttm"
 KEY_METRICS_V3 = "https://financialmodelingprep.com/stable/key-metrics"
+RATIOS_TTM_BULK = "https://financialmodelingprep.com/stable/ratios-ttm-bulk"
+
+# ratios-ttm-bulk field -> column name used by the per-symbol path
+BULK_RATIO_FIELDS = {
+    "priceToEarningsRatioTTM": "peRatioTTM",
+    "priceToBookRatioTTM": "priceToBookRatioTTM",
+    "enterpriseValueMultipleTTM": "enterpriseValueOverEBITDATTM",
+}
 
+DEFAULT_EXCHANGES  = ("NASDAQ", "NYSE")
+DEFAULT_COUNTRY    = "US"
 DEFAULT_MARKET_CAP = 500_000_000   # $500M
 DEFAULT_VOLUME     = 100_000       # 100k shares
 DEFAULT_LIMIT      = 1000          # per exchange
+MAX_LIMIT          = 3000          # sidebar cap on the per-exchange limit
+RESULTS_PAGE_SIZE  = 100           # rows per page in the full results table
+RATIOS_MAX_WORKERS = 16            # concurrent per-symbol ratio fetches
+# Per-symbol requests/sec across all workers. FMP plans allow roughly 5 to 50+ req/s, so set
+# FMP_RATE_LIMIT in secrets to match yours; the default is at least the old unthrottled pace.
+try:
+    RATIOS_RATE_LIMIT = float(st.secrets.get("FMP_RATE_LIMIT", 60))
+except (TypeError, ValueError):
+    RATIOS_RATE_LIMIT = 0.0
+if not RATIOS_RATE_LIMIT > 0:  # also rejects NaN
+    st.error("FMP_RATE_LIMIT in secrets must be a positive number of requests per second.")
+    st.stop()
+# Per-symbol cache size: every symbol of the largest possible run (all exchanges at MAX_LIMIT).
+# Eviction is LRU, so a smaller cache would cycle on a big universe and miss every symbol.
+RATIOS_CACHE_ENTRIES = len(DEFAULT_EXCHANGES) * MAX_LIMIT
+
+# Low-cardinality text columns stored as pandas categoricals (int-coded groupby keys, less memory)
+CATEGORY_COLS = ("sector", "industry", "sourceExchange", "exchange", "exchangeShortName", "country", "currency")
+# Screener fields that must be numeric; a stray null or string would otherwise leave them as object dtype
+SCREENER_NUMERIC_COLS = ("marketCap", "price", "beta", "volume", "lastAnnualDividend")
+# Valuation columns added by either ratios path; float32 is ample precision for ratios
+RATIO_COLS = ("peRatioTTM", "priceToBookRatioTTM", "enterpriseValueOverEBITDATTM")
 
 # --------------------------------
 # HTTP helpers
 # --------------------------------
+@st.cache_resource(show_spinner=False)
 def get_session():
+    """One Session per server process: the script re-executes on every rerun, the pool shouldn't."""
     s = requests.Session()
     s.headers.update({"User-Agent": "streamlit-fmp-screener/2.1"})
+    # Connection errors and transient 429/5xx are retried inside the adapter (honouring
+    # Retry-After), reusing the pooled connection rather than sleeping in Python.
+    retry = Retry(
+        total=4,
+        backoff_factor=0.25,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    # Keep-alive slots for every ratios worker, with headroom for a second concurrent
+    # session/user and the screener leg; anything beyond is opened and then discarded.
+    s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=2 * RATIOS_MAX_WORKERS, max_retries=retry))
     return s
 
-def get_json_with_retry(session, url: str, params: dict, retries: int = 2, timeout: int = 25):
-    last_exc = None
-    for i in range(retries + 1):
-        try:
-            r = session.get(url, params=params, timeout=timeout)
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            last_exc = e
-            time.sleep(0.8 * (2 ** i))
-    raise last_exc
+# Shared by the screener and ratios fetches (and across reruns/users) so TCP/TLS
+# connections to FMP are reused.
+SESSION = get_session()
+
+class TokenBucket:
+    """Thread-safe token bucket: paces callers to `rate` per second, allowing bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        # At least one token, or a sub-1 req/s rate could never fill the bucket enough to acquire
+        self.capacity = max(1.0, float(capacity or rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            # Sleep outside the lock so other workers can re-check
+            time.sleep(wait)
+
+@st.cache_resource(show_spinner=False)
+def get_rate_limiter() -> TokenBucket:
+    """Process-wide limiter for the per-symbol endpoints, shared across reruns and users."""
+    return TokenBucket(RATIOS_RATE_LIMIT)
+
+RATE_LIMITER = get_rate_limiter()
+
+def get_json_with_retry(session, url: str, params: dict, timeout: int = 25):
+    """GET and decode JSON. Retries and backoff happen in the session's adapter (see get_session)."""
+    r = session.get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    return _loads(r.content)
+
+def cache_bucket(seconds: int = 900) -> int:
+    """
+    Coarse clock to pass into disk-persisted caches. Streamlit ignores `ttl` when
+    persist="disk", so expiry is folded into the cache key instead.
+    """
+    return int(time.time() // seconds)
+
+@st.cache_resource(show_spinner=False)
+def _disk_cache_buckets() -> dict:
+    """Last bucket handed out per disk-persisted function, for this server process."""
+    return {}
+
+def disk_cache_bucket(fn, seconds: int = 900) -> int:
+    """
+    cache_bucket for a persist="disk" function that also prunes its old files. Streamlit's
+    disk storage never deletes entries (max_entries only bounds the in-memory layer), so
+    when the bucket rolls over every persisted entry of `fn` is expired: clear them.
+    """
+    bucket = cache_bucket(seconds)
+    seen = _disk_cache_buckets()
+    last = seen.get(fn.__name__)
+    seen[fn.__name__] = bucket
+    if last is not None and last != bucket:
+        fn.clear()
+    return bucket
 
 # --------------------------------
 # Screener fetch (cached)
 # --------------------------------
-@st.cache_data(ttl=900, show_spinner=False)  # 15 minutes
+class ScreenerFetchError(Exception):
+    """Some exchanges failed; `frame` holds whatever the others returned (possibly empty)."""
+
+    def __init__(self, errors: list, frame: pd.DataFrame):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+        self.frame = frame
+
+@st.cache_data(persist="disk", max_entries=64, show_spinner=False)
 def fetch_screener_batch(
     exchanges: tuple,
     market_cap_more: int,
@@ -79,10 +206,12 @@ def fetch_screener_batch(
     country: str,
     limit: int,
     include_all_share_classes: bool,
+    bucket: int,
 ):
-    """Fetch NASDAQ/NYSE in parallel; return merged, deduped DataFrame."""
-    session = get_session()
-
+    """
+    Fetch NASDAQ/NYSE in parallel; return merged, deduped DataFrame.
+    `bucket` (see cache_bucket) expires the on-disk cache entry every 15 minutes.
+    """
     def _params(exchange: str):
         return {
             "apikey": FMP_API_KEY,
@@ -97,103 +226,366 @@ def fetch_screener_batch(
             "includeAllShareClasses": str(include_all_share_classes).lower(),
         }
 
-    dfs, errors = [], []
-    with ThreadPoolExecutor(max_workers=min(4, len(exchanges))) as ex:
-        futs = {ex.submit(get_json_with_retry, session, SCREENER_URL, _params(x)): x for x in exchanges}
-        for fut in as_completed(futs):
-            exch = futs[fut]
-            try:
-                data = fut.result()
-                df = pd.DataFrame(data)
-                if not df.empty:
-                    df["sourceExchange"] = exch
-                dfs.append(df)
-            except Exception as e:
-                errors.append(f"{exch}: {e}")
-
+    def _rows(payload) -> list:
+        # FMP reports key/plan problems as a 200 with a JSON object, e.g. {"Error Message": ...}
+        if payload is None:
+            return []
+        if not isinstance(payload, list):
+            detail = payload.get("Error Message", payload) if isinstance(payload, dict) else payload
+            raise ValueError(f"unexpected screener response: {detail}")
+        return payload
+
+    payloads, errors = {}, []
+    if len(exchanges) == 1:
+        # Nothing to overlap with a single request; skip the pool
+        exch = exchanges[0]
+        try:
+            payloads[exch] = _rows(get_json_with_retry(SESSION, SCREENER_URL, _params(exch)))
+        except Exception as e:
+            errors.append(f"{exch}: {e}")
+    else:
+        with ThreadPoolExecutor(max_workers=min(4, len(exchanges))) as ex:
+            futs = {ex.submit(get_json_with_retry, SESSION, SCREENER_URL, _params(x)): x for x in exchanges}
+            for fut in as_completed(futs):
+                exch = futs[fut]
+                try:
+                    payloads[exch] = _rows(fut.result())
+                except Exception as e:
+                    errors.append(f"{exch}: {e}")
+
+    df_all = _screener_frame(payloads, exchanges) if payloads else pd.DataFrame()
     if errors:
-        st.warning("Some requests failed: " + "; ".join(errors))
-
-    if not dfs:
-        return pd.DataFrame()
+        # Exceptions aren't memoised, so a partial batch never lands in the (disk) cache and
+        # the failed exchanges are retried on the next call, e.g. after a failed prefetch.
+        raise ScreenerFetchError(errors, df_all)
+    return df_all
 
-    df_all = pd.concat(dfs, ignore_index=True)
+def _screener_frame(payloads: dict, exchanges: tuple) -> pd.DataFrame:
+    """Merge per-exchange screener rows into one deduped, typed frame."""
+    # Dedupe on plain records before building one frame (no concat/drop_duplicates pass).
+    # Walk exchanges in sidebar order so the first listing of a symbol wins deterministically.
+    # Rows without a symbol are dropped: they can't be enriched, and the summaries count
+    # one row per ticker.
+    seen = {}
+    for exch in exchanges:
+        for row in payloads.get(exch, ()):
+            sym = row.get("symbol")
+            if sym is not None and sym not in seen:
+                seen[sym] = {**row, "sourceExchange": exch}
+    df_all = pd.DataFrame.from_records(list(seen.values()))
+    for c in SCREENER_NUMERIC_COLS:
+        if c in df_all.columns:
+            df_all[c] = pd.to_numeric(df_all[c], errors="coerce")
+    for c in CATEGORY_COLS:
+        if c in df_all.columns:
+            df_all[c] = df_all[c].astype("category")
     if "symbol" in df_all.columns:
-        df_all = df_all.drop_duplicates(subset=["symbol"]).reset_index(drop=True)
+        # Unique per row, so Arrow strings rather than a category: cheaper hashing for the ratios merge
+        df_all["symbol"] = df_all["symbol"].astype("string[pyarrow]")
     return df_all
 
+def _prefetch_default_screener():
+    """Warm fetch_screener_batch with the sidebar defaults so the first Run is a cache hit."""
+    try:
+        fetch_screener_batch(
+            exchanges=DEFAULT_EXCHANGES,
+            market_cap_more=DEFAULT_MARKET_CAP,
+            volume_more=DEFAULT_VOLUME,
+            country=DEFAULT_COUNTRY,
+            limit=DEFAULT_LIMIT,
+            include_all_share_classes=False,
+            bucket=disk_cache_bucket(fetch_screener_batch),
+        )
+    except Exception:
+        pass
+
+@st.cache_resource(show_spinner=False)
+def _start_prefetch():
+    """Start the warm-up thread once per server process; module globals reset on every rerun."""
+    t = threading.Thread(target=_prefetch_default_screener, name="screener-prefetch", daemon=True)
+    t.start()
+    return t
+
+_start_prefetch()
+
 # --------------------------------
-# Per-symbol ratios + key metrics
+# Bulk ratios (one request for the whole universe)
 # --------------------------------
-def _safe_first(js):
-    return js[0] if isinstance(js, list) and js else {}
-
-def _fetch_ratios_one(sym: str, session, timeout: int = 20) -> dict:
+@st.cache_data(persist="disk", max_entries=4, show_spinner=False)
+def fetch_ratios_bulk(bucket: int) -> pd.DataFrame:
     """
-    Fetch P/E & P/B from /api/v3/ratios-ttm/{symbol}.
-    Fetch EV/EBITDA from /stable/key-metrics?symbol={symbol}.
+    TTM P/E, P/B and EV/EBITDA for every symbol FMP covers, renamed to the per-symbol
+    column names and indexed by symbol. Returns an empty frame when the plan doesn't include bulk endpoints,
+    so that answer is cached for the bucket too; other errors propagate.
     """
-    out = {"symbol": sym, "peRatioTTM": None, "priceToBookRatioTTM": None, "enterpriseValueOverEBITDATTM": None}
-
-    # --- P/E and P/B ---
     try:
-        url = f"{RATIOS_TTM_V3}/{sym}"
-        r = session.get(url, params={"apikey": FMP_API_KEY}, timeout=timeout)
+        r = SESSION.get(RATIOS_TTM_BULK, params={"apikey": FMP_API_KEY}, timeout=60)
         r.raise_for_status()
-        row = _safe_first(r.json())
-        out["peRatioTTM"] = row.get("peRatioTTM")
-        out["priceToBookRatioTTM"] = row.get("priceToBookRatioTTM")
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code in (401, 402, 403, 404):
+            return pd.DataFrame()
+        raise
+    # Only pull the four fields we use into pandas; the payload has dozens per symbol.
+    # Rows stay universe-wide because this cache entry is shared by every screener query.
+    wanted = ["symbol", *BULK_RATIO_FIELDS]
+    try:
+        raw = _loads(r.content)
+    except ValueError:  # bulk endpoints may be served as CSV
+        bulk = pd.read_csv(io.BytesIO(r.content), usecols=wanted)
+    else:
+        # FMP also reports plan/key problems as a 200 with {"Error Message": ...}: cache that
+        # as "no bulk" like a 403, so non-bulk plans don't refetch it every Run
+        if isinstance(raw, dict) and "Error Message" in raw:
+            return pd.DataFrame()
+        if not isinstance(raw, list):
+            raise ValueError(f"unexpected ratios-ttm-bulk response: {type(raw).__name__}")
+        if raw and not set(wanted) <= raw[0].keys():
+            raise KeyError(f"ratios-ttm-bulk response is missing fields: {set(wanted) - raw[0].keys()}")
+        bulk = pd.DataFrame.from_records(raw, columns=wanted)
+    bulk = bulk.rename(columns=BULK_RATIO_FIELDS)
+    # Vectorised coercion; FMP sends "" / null for loss-makers, which would leave object columns
+    for c in RATIO_COLS:
+        bulk[c] = pd.to_numeric(bulk[c], errors="coerce", downcast="float")
+    # Indexed by a unique symbol so the enrichment is a many-to-one index join
+    return bulk.drop_duplicates("symbol").set_index("symbol")
+
+def _warm_ratios_bulk():
+    """Background run of fetch_ratios_bulk; failures are left for the enrichment step to handle."""
+    try:
+        fetch_ratios_bulk(disk_cache_bucket(fetch_ratios_bulk))
     except Exception:
         pass
 
-    # --- EV/EBITDA ---
+# --------------------------------
+# Per-symbol ratios + key metrics
+# --------------------------------
+def _safe_first(js):
+    return js[0] if isinstance(js, list) and js else {}
+
+# Cached per symbol in memory for an hour (TTM ratios move at most daily). Not persisted:
+# disk entries are never deleted, and each cache holds one entry per symbol of the universe.
+# `_session` is underscore-prefixed so Streamlit leaves it out of the cache key.
+# Errors propagate so a failed request is retried next run instead of cached.
+# Only cache misses reach the network, so only they take a RATE_LIMITER token.
+@st.cache_data(ttl=3600, max_entries=RATIOS_CACHE_ENTRIES, show_spinner=False)
+def _fetch_ratios_ttm(sym: str, _session, timeout: int = 20) -> dict:
+    """First row of /api/v3/ratios-ttm/{symbol} (P/E & P/B)."""
+    RATE_LIMITER.acquire()
+    r = _session.get(f"{RATIOS_TTM_V3}/{sym}", params={"apikey": FMP_API_KEY}, timeout=timeout)
+    r.raise_for_status()
+    return _safe_first(_loads(r.content))
+
+@st.cache_data(ttl=3600, max_entries=RATIOS_CACHE_ENTRIES, show_spinner=False)
+def _fetch_key_metrics(sym: str, _session, timeout: int = 20) -> dict:
+    """Latest FY row of /stable/key-metrics?symbol={symbol} (EV/EBITDA)."""
+    RATE_LIMITER.acquire()
+    r = _session.get(KEY_METRICS_V3, params={"apikey": FMP_API_KEY, "symbol": sym, "limit": 1, "period": "FY"}, timeout=timeout)
+    r.raise_for_status()
+    return _safe_first(_loads(r.content))
+
+def _as_float(v) -> float:
+    """FMP ratio value -> float; None, "" and junk become NaN."""
+    try:
+        return float(v) if v not in (None, "") else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+# The two legs are independent, so each is its own pool task and a symbol's
+# wall time is max(ratios, key-metrics) rather than their sum.
+# Failures and empty responses (common for financials/REITs) share these sentinels.
+_NAN_PAIR = (math.nan, math.nan)
+_NAN_ONE = (math.nan,)
+
+def _fetch_pe_pb(sym: str, session, timeout: int = 20) -> tuple:
+    """(P/E, P/B) from /api/v3/ratios-ttm/{symbol}; NaNs on failure or an empty response."""
     try:
-        r2 = session.get(KEY_METRICS_V3, params={"apikey": FMP_API_KEY, "symbol": sym, "limit": 1, "period": "FY"}, timeout=timeout)
-        r2.raise_for_status()
-        row2 = _safe_first(r2.json())
-        ev_ebitda = row2.get("evToEBITDA")
-        if ev_ebitda not in (None, ""):
-            out["enterpriseValueOverEBITDATTM"] = ev_ebitda
+        row = _fetch_ratios_ttm(sym, session, timeout)
     except Exception:
-        pass
+        return _NAN_PAIR
+    if not row:
+        return _NAN_PAIR
+    return _as_float(row.get("peRatioTTM")), _as_float(row.get("priceToBookRatioTTM"))
 
-    return out
+def _fetch_ev_ebitda(sym: str, session, timeout: int = 20) -> tuple:
+    """(EV/EBITDA,) from /stable/key-metrics?symbol={symbol}; NaN on failure or an empty response."""
+    try:
+        row = _fetch_key_metrics(sym, session, timeout)
+    except Exception:
+        return _NAN_ONE
+    if not row:
+        return _NAN_ONE
+    return (_as_float(row.get("evToEBITDA")),)
+
+# Each leg's tuple, in order, fills these RATIO_COLS
+_RATIO_LEGS = (
+    (_fetch_pe_pb, ("peRatioTTM", "priceToBookRatioTTM")),
+    (_fetch_ev_ebitda, ("enterpriseValueOverEBITDATTM",)),
+)
+
+def _ratios_for_symbols(
+    symbols: tuple,
+    max_workers: int = RATIOS_MAX_WORKERS,
+) -> pd.DataFrame:
+    """
+    Per-symbol ratios fan-out, indexed by symbol. Deliberately not cached as a whole: the
+    legs turn failures into NaN, and the per-symbol caches already make repeat runs cheap.
+    """
+    # Typed column buffers filled by position as legs complete; no per-row dicts or dtype inference
+    cols = {c: np.full(len(symbols), np.nan, dtype=np.float32) for c in RATIO_COLS}
+
+    progress = st.progress(0, text="Fetching valuation ratios…")
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futs = {
+            pool.submit(leg, s, SESSION): (i, names)
+            for i, s in enumerate(symbols)
+            for leg, names in _RATIO_LEGS
+        }
+        total = len(futs)
+        for fut in as_completed(futs):
+            i, names = futs[fut]
+            for name, value in zip(names, fut.result()):
+                cols[name][i] = value
+            done += 1
+            if done % 20 == 0 or done == total:
+                progress.progress(done / total, text=f"Valuation ratios… {done}/{total} requests")
+
+    progress.empty()
+    return pd.DataFrame(cols, index=pd.Index(symbols, name="symbol"))
+
+def _to_arrow_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Move the merged frame onto Arrow-backed dtypes; categoricals are left as they are."""
+    try:
+        # convert_integer=False keeps whole-valued floats (marketCap) as floats
+        return df.convert_dtypes(dtype_backend="pyarrow", convert_integer=False)
+    except (ImportError, TypeError, ValueError):
+        return df
 
 def add_valuation_columns_from_symbols(
     df: pd.DataFrame,
-    max_workers: int = 8,
-    throttle_every: int = 60,
-    sleep_secs: float = 1.0
+    max_workers: int = RATIOS_MAX_WORKERS,
 ) -> pd.DataFrame:
     """
     Fetch P/E, P/B, EV/EBITDA for exactly the symbols in df.
+    Uses the bulk endpoint when available, otherwise one request pair per symbol.
     """
     if df.empty or "symbol" not in df.columns:
         return df
 
-    session = requests.Session()
-    session.headers.update({"User-Agent": "streamlit-fmp-screener/per-symbol"})
+    try:
+        bulk = fetch_ratios_bulk(disk_cache_bucket(fetch_ratios_bulk))
+    except Exception:
+        bulk = pd.DataFrame()
+    if not bulk.empty:
+        return _to_arrow_dtypes(df.join(bulk, on="symbol", how="left", validate="m:1"))
 
-    symbols = df["symbol"].dropna().unique().tolist()
-    results = []
+    symbols = tuple(sorted(df["symbol"].dropna().unique()))
+    if not symbols:
+        return df
+    ratios_df = _ratios_for_symbols(symbols, max_workers)
+    return _to_arrow_dtypes(df.join(ratios_df, on="symbol", how="left", validate="m:1"))
 
-    progress = st.progress(0, text="Fetching valuation ratios…")
+# --------------------------------
+# Sector / industry summaries
+# --------------------------------
+def _summary_fingerprint(df: pd.DataFrame) -> tuple:
+    """Cache key for the summaries: a vectorised hash of just the columns they read."""
+    cols = [c for c in ("symbol", "sector", "industry", "marketCap") if c in df.columns]
+    return len(df), tuple(cols), int(pd.util.hash_pandas_object(df[cols], index=False).sum())
+
+_SUMMARY_HASH_FUNCS = {pd.DataFrame: _summary_fingerprint}
+
+@st.cache_data(max_entries=16, show_spinner=False, hash_funcs=_SUMMARY_HASH_FUNCS)
+def _industry_rollup(df: pd.DataFrame) -> pd.DataFrame:
+    """Ticker counts and market-cap totals per (sector, industry); both summaries build on this."""
+    keys = [c for c in ("sector", "industry") if c in df.columns]
+    # invariant: every row has a symbol and symbols are unique (fetch_screener_batch drops
+    # symbol-less rows while deduping), so row count == ticker count.
+    # Every statistic is then a reduction over marketCap, so one SeriesGroupBy.agg covers them all.
+    return (
+        df.groupby(keys, dropna=False, observed=True)["marketCap"]
+          .agg(tickers="size", mktcap_n="count", total_mktcap="sum", avg_mktcap="mean")
+    )
+
+@st.cache_data(max_entries=16, show_spinner=False, hash_funcs=_SUMMARY_HASH_FUNCS)
+def _sector_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Roll the industry grain up to sectors. Ticker counts add up because symbols are
+    unique after dedup; only the median needs another pass over the raw rows.
+    """
+    ind = _industry_rollup(df)
+    sec = ind.groupby(level="sector", dropna=False, observed=True)[["tickers", "mktcap_n", "total_mktcap"]].sum()
+    sec["avg_mktcap"] = sec["total_mktcap"] / sec["mktcap_n"]
+    sec["median_mktcap"] = df.groupby("sector", dropna=False, observed=True)["marketCap"].median()
+    return sec.drop(columns="mktcap_n").sort_values("tickers", ascending=False)
+
+@st.cache_data(max_entries=16, show_spinner=False, hash_funcs=_SUMMARY_HASH_FUNCS)
+def _industry_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """Industry summary as displayed: sectors A–Z, largest industries first within each."""
+    return (
+        _industry_rollup(df)
+          .drop(columns="mktcap_n")
+          .sort_values(["sector", "tickers"], ascending=[True, False])
+    )
 
-    done, total = 0, len(symbols)
-    with ThreadPoolExecutor(max_workers=max_workers) as pool:
-        futs = {pool.submit(_fetch_ratios_one, s, session): s for s in symbols}
-        for fut in as_completed(futs):
-            results.append(fut.result())
-            done += 1
-            if throttle_every and (done % throttle_every == 0):
-                time.sleep(sleep_secs)
-            if done % 10 == 0 or done == total:
-                progress.progress(done / total, text=f"Valuation ratios… {done}/{total}")
+# --------------------------------
+# Download helpers
+# --------------------------------
+# In memory only: the bytes are cheap to rebuild from the frame, and a persisted blob per
+# distinct frame would pile up on disk.
+@st.cache_data(max_entries=16, show_spinner=False)
+def _df_to_csv_gz_bytes(df: pd.DataFrame) -> bytes:
+    """Gzipped CSV bytes for the download button, memoised on the DataFrame's contents."""
+    # Arrow's C++ writer emits UTF-8 bytes directly; categoricals are written as their labels.
+    buf = io.BytesIO()
+    try:
+        pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buf)
+        raw = buf.getvalue()
+    except pa.ArrowException:  # e.g. nested/mixed-type object columns Arrow can't convert
+        raw = df.to_csv(index=False).encode()
+    # Level 1: nearly all of the size win on repetitive CSV text for a fraction of the CPU
+    return gzip.compress(raw, compresslevel=1)
 
-    progress.empty()
-    ratios_df = pd.DataFrame(results)
-    merged = df.merge(ratios_df, on="symbol", how="left")
-    return merged
+# --------------------------------
+# Results rendering (fragments)
+# --------------------------------
+# Each block reruns on its own when its widget changes, instead of the whole script.
+# They read the last run from st.session_state["results"], set by the Run block below.
+# Money columns stay numeric; the browser formats them
+MONEY_COLUMN = st.column_config.NumberColumn(format="$%,.0f")
+
+@st.fragment
+def _render_sector_summary():
+    df = st.session_state["results"]["df"]
+    if not st.checkbox("Show sector summary", value=True) or "sector" not in df.columns:
+        return
+    st.subheader("Sector Summary")
+    st.dataframe(_sector_summary(df), use_container_width=True, column_config={
+        "total_mktcap": MONEY_COLUMN, "avg_mktcap": MONEY_COLUMN, "median_mktcap": MONEY_COLUMN,
+    })
+
+@st.fragment
+def _render_industry_summary():
+    df = st.session_state["results"]["df"]
+    if not st.checkbox("Show industry summary", value=False) or not {"sector", "industry"} <= set(df.columns):
+        return
+    st.subheader("Industry Summary")
+    st.dataframe(_industry_summary(df), use_container_width=True, column_config={
+        "total_mktcap": MONEY_COLUMN, "avg_mktcap": MONEY_COLUMN,
+    })
+
+@st.fragment
+def _render_results_table():
+    df = st.session_state["results"]["df"]
+    n = len(df)
+    st.subheader("Results (All columns)")
+    # Ship one page to the browser at a time; the CSV below still has every row
+    pages = max(1, math.ceil(n / RESULTS_PAGE_SIZE))
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1) if pages > 1 else 1
+    start = (int(page) - 1) * RESULTS_PAGE_SIZE
+    st.dataframe(df.iloc[start:start + RESULTS_PAGE_SIZE], use_container_width=True, hide_index=True)
+    st.caption(f"Rows {start + 1:,}–{min(start + RESULTS_PAGE_SIZE, n):,} of {n:,}")
 
 # --------------------------------
 # UI
@@ -204,94 +596,93 @@ if check_password():
 
     with st.sidebar:
         st.header("Filters")
-        exchanges = st.multiselect("Exchanges", ["NASDAQ", "NYSE"], default=["NASDAQ", "NYSE"])
-        country = st.text_input("Country", "US")
+        exchanges = st.multiselect("Exchanges", ["NASDAQ", "NYSE"], default=list(DEFAULT_EXCHANGES))
+        country = st.text_input("Country", DEFAULT_COUNTRY)
         market_cap_more = st.number_input("Market Cap ≥", value=DEFAULT_MARKET_CAP, min_value=0, step=50_000_000)
         volume_more     = st.number_input("Avg Daily Volume ≥", value=DEFAULT_VOLUME, min_value=0, step=10_000)
-        limit           = st.number_input("Per-exchange limit", value=DEFAULT_LIMIT, min_value=10, max_value=3000, step=100)
+        limit           = st.number_input("Per-exchange limit", value=DEFAULT_LIMIT, min_value=10, max_value=MAX_LIMIT, step=100)
         include_all_share_classes = st.checkbox("Include all share classes", value=False)
 
         st.divider()
         st.header("Display")
-        show_sector_summary   = st.checkbox("Show sector summary", value=True)
-        show_industry_summary = st.checkbox("Show industry summary", value=False)
         show_all_columns      = st.checkbox("Show full table", value=True)
         quick_mode            = st.checkbox("Quick mode (summaries + download only)", value=False)
 
         run_btn = st.button("Run Screener", type="primary", use_container_width=True)
+        # The bulk ratio cache outlives restarts (persist="disk"); this is the manual invalidation
+        if st.button("Refresh valuations", use_container_width=True,
+                     help="Forget cached P/E, P/B and EV/EBITDA so the next run refetches them."):
+            fetch_ratios_bulk.clear()
+            _fetch_ratios_ttm.clear()
+            _fetch_key_metrics.clear()
+            st.toast("Valuation cache cleared.")
 
     if run_btn:
         if not exchanges:
             st.warning("Pick at least one exchange.")
             st.stop()
 
+        # Start the bulk ratios download now so it overlaps the screener request; step 2
+        # then picks up the same cache entry (Streamlit computes each cache key only once).
+        threading.Thread(target=_warm_ratios_bulk, name="ratios-bulk-warm", daemon=True).start()
+
         # 1) Screener
         t0 = time.time()
         with st.spinner("Fetching screener data…"):
-            df = fetch_screener_batch(
-                exchanges=tuple(exchanges),
-                market_cap_more=int(market_cap_more),
-                volume_more=int(volume_more),
-                country=country,
-                limit=int(limit),
-                include_all_share_classes=include_all_share_classes,
-            )
+            try:
+                df = fetch_screener_batch(
+                    exchanges=tuple(exchanges),
+                    market_cap_more=int(market_cap_more),
+                    volume_more=int(volume_more),
+                    country=country,
+                    limit=int(limit),
+                    include_all_share_classes=include_all_share_classes,
+                    bucket=disk_cache_bucket(fetch_screener_batch),
+                )
+            except ScreenerFetchError as e:
+                # Show what did come back; the partial batch isn't cached, so the next Run retries
+                st.warning("Some requests failed: " + "; ".join(e.errors))
+                df = e.frame
         screener_secs = time.time() - t0
 
         if df.empty:
+            st.session_state.pop("results", None)
             st.error("No data returned. Try lowering filters or increasing the per-exchange limit.")
             st.stop()
 
         # 2) Ratios
         t1 = time.time()
         with st.spinner("Fetching valuation metrics…"):
-            df = add_valuation_columns_from_symbols(
-                df, max_workers=8, throttle_every=60, sleep_secs=1.0
-            )
+            df = add_valuation_columns_from_symbols(df, max_workers=RATIOS_MAX_WORKERS)
         ratio_secs = time.time() - t1
 
+        # Keep results across reruns so display toggles and paging don't need another Run
+        st.session_state["results"] = {
+            "df": df,
+            "screener_secs": screener_secs,
+            "ratio_secs": ratio_secs,
+            "market_cap_more": int(market_cap_more),
+            "volume_more": int(volume_more),
+        }
+
+    results = st.session_state.get("results")
+    if results:
+        df = results["df"]
+
         # Metrics
         n = len(df)
         col1, col2, col3, col4 = st.columns(4)
         with col1: st.metric("Total tickers", n)
-        with col2: st.metric("Min Market Cap", f"${int(market_cap_more):,}")
-        with col3: st.metric("Min Volume", f"{int(volume_more):,} shares")
-        with col4: st.metric("Timing", f"Screener {screener_secs:.1f}s • Ratios {ratio_secs:.1f}s")
+        with col2: st.metric("Min Market Cap", f"${results['market_cap_more']:,}")
+        with col3: st.metric("Min Volume", f"{results['volume_more']:,} shares")
+        with col4: st.metric("Timing", f"Screener {results['screener_secs']:.1f}s • Ratios {results['ratio_secs']:.1f}s")
 
         st.caption("Deduped by symbol • Some ratios may be blank for loss-making firms or financials/REITs.")
         st.divider()
 
-        # Optional summaries
-        def _fmt_money(x):
-            try: return f"${x:,.0f}"
-            except Exception: return x
-
-        if show_sector_summary and "sector" in df.columns:
-            st.subheader("Sector Summary")
-            sec = (
-                df.groupby("sector", dropna=False)
-                  .agg(tickers=("symbol", "nunique"),
-                       total_mktcap=("marketCap", "sum"),
-                       avg_mktcap=("marketCap", "mean"),
-                       median_mktcap=("marketCap", "median"))
-                  .sort_values("tickers", ascending=False)
-            )
-            for c in ["total_mktcap", "avg_mktcap", "median_mktcap"]:
-                if c in sec.columns: sec[c] = sec[c].apply(_fmt_money)
-            st.dataframe(sec, use_container_width=True)
-
-        if show_industry_summary and "industry" in df.columns:
-            st.subheader("Industry Summary")
-            ind = (
-                df.groupby(["sector", "industry"], dropna=False)
-                  .agg(tickers=("symbol", "nunique"),
-                       total_mktcap=("marketCap", "sum"),
-                       avg_mktcap=("marketCap", "mean"))
-                  .sort_values(["sector", "tickers"], ascending=[True, False])
-            )
-            for c in ["total_mktcap", "avg_mktcap"]:
-                if c in ind.columns: ind[c] = ind[c].apply(_fmt_money)
-            st.dataframe(ind, use_container_width=True)
+        # Optional summaries; both share one cached (sector, industry) groupby
+        _render_sector_summary()
+        _render_industry_summary()
 
         st.divider()
 
@@ -301,13 +692,12 @@ if check_password():
         show_cols = [c for c in val_cols if c in df.columns]
         if show_cols:
             st.subheader("Valuation Columns (preview)")
-            st.dataframe(df[show_cols].head(30), use_container_width=True, hide_index=True)
+            st.dataframe(df.head(30).loc[:, show_cols], use_container_width=True, hide_index=True)
 
         # Full table (optional)
         if show_all_columns and not quick_mode:
-            st.subheader("Results (All columns)")
-            st.dataframe(df, use_container_width=True, hide_index=True)
+            _render_results_table()
 
         # Download
-        csv = df.to_csv(index=False).encode()
-        st.download_button("⬇️ Download CSV", data=csv, file_name="us_universe_full.csv", mime="text/csv")
+        csv_gz = _df_to_csv_gz_bytes(df)
+        st.download_button("⬇️ Download CSV (gzip)", data=csv_gz, file_name="us_universe_full.csv.gz", mime="application/gzip")